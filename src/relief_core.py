@@ -0,0 +1,655 @@
+"""
+Shared image -> thickness relief -> PNG16 / NPY / STL pipeline.
+make_relief.py and make1_relief.py are thin CLIs over this module, so the
+sRGB LUT and numba compile cache exist only once.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+__all__ = [
+    "DEFAULT_WIDTH_MM", "TARGET_WIDTH_PX_DEFAULT", "BASE_THICK_MM_DEFAULT", "RELIEF_MM_DEFAULT",
+    "BLACK_CUT_DEFAULT", "WHITE_CUT_DEFAULT", "TONE_GAMMA_DEFAULT", "ADAPTIVE_TOL_DEFAULT",
+    "srgb_to_linear", "luminance_Y_from_linear_rgb", "tone_map", "apply_orientation",
+    "make_thickness_mm", "save_heightmap", "write_binary_stl", "heightmap_to_stl",
+    "resolve_out_base", "build_arg_parser", "run",
+]
+
+
+# Defaults
+DEFAULT_WIDTH_MM = 100.0
+
+TARGET_WIDTH_PX_DEFAULT = 600
+BASE_THICK_MM_DEFAULT = 0.8
+RELIEF_MM_DEFAULT = 1.5
+
+BLACK_CUT_DEFAULT = 0.02
+WHITE_CUT_DEFAULT = 0.98
+TONE_GAMMA_DEFAULT = 1.15
+
+# --adaptive: split a mesh block while its height error > tol * thickness range
+ADAPTIVE_TOL_DEFAULT = 0.02
+
+
+def srgb_to_linear(srgb01: np.ndarray) -> np.ndarray:
+    """sRGB (0..1) -> linear RGB (0..1)"""
+    a = 0.055
+    return np.where(
+        srgb01 <= 0.04045,
+        srgb01 / 12.92,
+        ((srgb01 + a) / (1 + a)) ** 2.4
+    )
+
+
+def _build_lut() -> np.ndarray:
+    """sRGB -> linear for every 8-bit code value (256-entry float32 table)"""
+    return srgb_to_linear(np.arange(256, dtype=np.float64) / 255.0).astype(np.float32)
+
+
+_REC709_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+_SRGB_LUT = _build_lut()
+# Per-channel linear luminance, pre-weighted: Y = _LUT_R[r] + _LUT_G[g] + _LUT_B[b]
+_LUT_R = (0.2126 * _SRGB_LUT.astype(np.float64)).astype(np.float32)
+_LUT_G = (0.7152 * _SRGB_LUT.astype(np.float64)).astype(np.float32)
+_LUT_B = (0.0722 * _SRGB_LUT.astype(np.float64)).astype(np.float32)
+
+
+def luminance_Y_from_linear_rgb(rgb_lin: np.ndarray) -> np.ndarray:
+    """linear RGB -> relative luminance Y (Rec.709 / sRGB primaries)"""
+    # one fused reduction over the channel axis (no per-channel temporaries)
+    weights = _REC709_WEIGHTS.astype(np.result_type(rgb_lin.dtype, np.float32), copy=False)
+    return np.einsum("...k,k->...", rgb_lin, weights, optimize=True)
+
+
+def tone_map(Y: np.ndarray, black_cut: float, white_cut: float, tone_gamma: float) -> np.ndarray:
+    """clip + gentle tone curve (works in linear luminance domain)"""
+    if white_cut <= black_cut:
+        raise ValueError("white_cut must be > black_cut")
+
+    # One buffer, updated in place (asarray: scalar input still gets a writable 0-d buffer)
+    Yt = np.asarray(np.subtract(Y, black_cut))
+    Yt *= 1.0 / (white_cut - black_cut)
+    np.clip(Yt, 0.0, 1.0, out=Yt)
+    np.power(Yt, 1.0 / tone_gamma, out=Yt)
+    if tone_gamma < 0:
+        # x**p stays in [0,1] only for p >= 0; a negative gamma needs the upper clip again
+        np.minimum(Yt, 1.0, out=Yt)
+    return Yt if Yt.ndim else Yt[()]
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def rgb_u8_to_height16(rgb_u8, black_cut, white_cut, inv_gamma, invert, flip_x, flip_y):
+        """
+        Fused uint8 sRGB -> linear -> luminance Y -> tone map -> uint16 height code
+        (0..65535 over base..base+relief, see _Thickness).
+        One pass over the image; no float temporaries. Flips are applied
+        in the same write, so no extra orientation pass is needed.
+        """
+        H, W = rgb_u8.shape[0], rgb_u8.shape[1]
+        out = np.empty((H, W), dtype=np.uint16)
+        scale = 1.0 / (white_cut - black_cut)
+
+        for i in prange(H):
+            # prange index is unsigned; cast so the flipped row stays an integer
+            row = np.int64(i)
+            yi = (H - 1 - row) if flip_y else row
+            for j in range(W):
+                xj = (W - 1 - j) if flip_x else j
+                Y = (_LUT_R[rgb_u8[i, j, 0]] +
+                     _LUT_G[rgb_u8[i, j, 1]] +
+                     _LUT_B[rgb_u8[i, j, 2]])
+
+                # outer min: a negative tone gamma pushes x**p above 1 (same clip as tone_map)
+                Yt = min(min(max((Y - black_cut) * scale, 0.0), 1.0) ** inv_gamma, 1.0)
+
+                v = (1.0 - Yt) if invert else Yt
+                out[yi, xj] = np.uint16(np.rint(v * 65535.0))
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _quantize_u16(thickness_mm, tmin, scale):
+        """(thickness - tmin) * scale -> clamp -> round -> uint16, in one pass"""
+        H, W = thickness_mm.shape
+        out = np.empty((H, W), dtype=np.uint16)
+        for i in prange(H):
+            for j in range(W):
+                v = (thickness_mm[i, j] - tmin) * scale
+                out[i, j] = np.uint16(np.rint(min(max(v, 0.0), 65535.0)))
+        return out
+
+
+@dataclass
+class _Thickness:
+    """
+    Thickness map stored as uint16 codes: base_mm + relief_mm * values / 65535.
+    Half the memory of float32; promoted to mm only where needed (NPY, STL vertices).
+    """
+    base_mm: float
+    relief_mm: float
+    values: np.ndarray  # (H,W) uint16
+
+    def as_float32(self, out: np.ndarray | None = None) -> np.ndarray:
+        t = np.multiply(self.values, np.float32(self.relief_mm / 65535.0), out=out, dtype=np.float32)
+        t += np.float32(self.base_mm)
+        return t
+
+    def normalized_u16(self) -> np.ndarray:
+        """
+        Thickness min..max stretched to 0..65535 (the codes as-is when they already span it).
+        Thickness is affine in the codes, so a negative relief reverses them and a zero range
+        gives all zeros, the same as normalizing as_float32().
+        """
+        vmin, vmax = int(self.values.min()), int(self.values.max())
+        if self.relief_mm == 0.0 or vmin == vmax:
+            return np.zeros_like(self.values)
+        if self.relief_mm > 0.0:
+            if (vmin, vmax) == (0, 65535):
+                return self.values
+            buf = np.subtract(self.values, vmin, dtype=np.float32)
+        else:
+            buf = np.subtract(vmax, self.values, dtype=np.float32)
+        buf *= np.float32(65535.0 / (vmax - vmin))
+        np.rint(buf, out=buf)
+        return buf.astype(np.uint16, copy=False)
+
+
+def apply_orientation(thickness_mm: np.ndarray, flip_x: bool, flip_y: bool, rot180: bool) -> np.ndarray:
+    if rot180:
+        flip_x = True
+        flip_y = True
+
+    if flip_x:
+        thickness_mm = thickness_mm[:, ::-1]
+    if flip_y:
+        thickness_mm = thickness_mm[::-1, :]
+
+    return thickness_mm
+
+
+def make_thickness_mm(
+    img_path: str,
+    target_width_mm: float,
+    target_width_px: int,
+    base_thick_mm: float,
+    relief_mm: float,
+    black_cut: float,
+    white_cut: float,
+    tone_gamma: float,
+    invert: bool,
+    flip_x: bool,
+    flip_y: bool,
+    rot180: bool
+) -> tuple[np.ndarray, float]:
+    """
+    Returns:
+      thickness_mm: (H,W) float32, total thickness in mm (bottom z=0)
+      px_mm: pixel size in mm
+    """
+    thickness, px_mm = _make_thickness(
+        img_path, target_width_mm, target_width_px, base_thick_mm, relief_mm,
+        black_cut, white_cut, tone_gamma, invert, flip_x, flip_y, rot180
+    )
+    return thickness.as_float32(), px_mm
+
+
+def _make_thickness(
+    img_path: str,
+    target_width_mm: float,
+    target_width_px: int,
+    base_thick_mm: float,
+    relief_mm: float,
+    black_cut: float,
+    white_cut: float,
+    tone_gamma: float,
+    invert: bool,
+    flip_x: bool,
+    flip_y: bool,
+    rot180: bool
+) -> tuple[_Thickness, float]:
+    """make_thickness_mm, but returns the uint16-backed _Thickness"""
+    img = Image.open(img_path)
+
+    w, h = img.size
+    target_h = int(round(h * (target_width_px / w)))
+    if img.format == "JPEG":
+        # Let libjpeg decode at a reduced DCT scale (1/2, 1/4, 1/8) that is still
+        # >= 2x the target, so Lanczos never sees the full-resolution original
+        img.draft("RGB", (target_width_px * 2, target_h * 2))
+    img = img.convert("RGB")
+    img_r = img.resize((target_width_px, target_h), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    # Stay in uint8 until the LUT gather (no float32 /255 temporary)
+    arr_u8 = np.asarray(img_r, dtype=np.uint8)
+
+    if njit is not None:
+        if white_cut <= black_cut:
+            raise ValueError("white_cut must be > black_cut")
+        # Orientation is fused into the kernel's write so PNG/NPY/STL always match
+        values = rgb_u8_to_height16(
+            arr_u8,
+            float(black_cut), float(white_cut), 1.0 / float(tone_gamma), bool(invert),
+            bool(flip_x or rot180), bool(flip_y or rot180)
+        )
+    else:
+        Y = _LUT_R[arr_u8[..., 0]] + _LUT_G[arr_u8[..., 1]] + _LUT_B[arr_u8[..., 2]]
+        Yt = tone_map(Y, black_cut, white_cut, tone_gamma)
+
+        # Bright=Thin (invert) is the default for backlit transmission:
+        # thickness = base + relief * (1 - Yt)
+        # Otherwise (non-invert): thickness = base + relief * Yt
+        if invert:
+            np.subtract(1.0, Yt, out=Yt)
+        Yt *= 65535.0
+        np.rint(Yt, out=Yt)
+
+        # Orientation is applied by writing through a flipped view of the output,
+        # so PNG/NPY/STL always match without an extra copy
+        values = np.empty(Yt.shape, dtype=np.uint16)
+        apply_orientation(values, flip_x=flip_x, flip_y=flip_y, rot180=rot180)[...] = Yt
+
+    px_mm = float(target_width_mm) / float(target_width_px)
+    return _Thickness(float(base_thick_mm), float(relief_mm), values), px_mm
+
+
+def save_heightmap(thickness_mm: "np.ndarray | _Thickness", out_png16: Path, out_npy: Path):
+    """Save normalized 16-bit PNG + raw mm values as .npy"""
+    print(_save_heightmap(thickness_mm, out_png16, out_npy))
+
+
+def _save_heightmap(thickness_mm: "np.ndarray | _Thickness", out_png16: Path, out_npy: Path) -> str:
+    """save_heightmap, but returns the report instead of printing it (safe to run off the main thread)"""
+    if isinstance(thickness_mm, _Thickness):
+        # Already quantized: the PNG is the thickness-normalized codes (identity in the common case)
+        png16 = thickness_mm.normalized_u16()
+        thickness_mm = thickness_mm.as_float32()
+        return _write_heightmap(png16, thickness_mm, out_png16, out_npy)
+
+    tmin = float(thickness_mm.min())
+    tmax = float(thickness_mm.max())
+    scale = 65535.0 / max(1e-9, (tmax - tmin))
+    if njit is not None:
+        png16 = _quantize_u16(thickness_mm, tmin, scale)
+    else:
+        buf = np.subtract(thickness_mm, np.float32(tmin), dtype=np.float32)
+        buf *= np.float32(scale)
+        np.rint(buf, out=buf)
+        png16 = buf.astype(np.uint16, copy=False)
+
+    return _write_heightmap(png16, thickness_mm, out_png16, out_npy)
+
+
+def _write_heightmap(png16: np.ndarray, thickness_mm: np.ndarray, out_png16: Path, out_npy: Path) -> str:
+    Image.fromarray(png16, mode="I;16").save(str(out_png16))
+    np.save(str(out_npy), thickness_mm)
+
+    return (f"saved: {out_png16.name} , {out_npy.name} (in {out_png16.parent})\n"
+            f"thickness range: {float(thickness_mm.min()):.3f} .. {float(thickness_mm.max()):.3f} mm")
+
+
+_STL_RECORD = np.dtype([("n", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+
+
+def write_binary_stl(vertices: np.ndarray, faces: np.ndarray, out_stl: Path):
+    """
+    Binary STL: 80-byte header, uint32 triangle count, then one packed
+    50-byte record (normal, 3 vertices, attribute) per triangle.
+    Records are filled as one structured array and written in a single call.
+    """
+    T = faces.shape[0]
+    rec = np.empty(T, dtype=_STL_RECORD)
+    rec["v"] = vertices[faces]
+
+    tri = rec["v"]
+    n = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    n /= np.maximum(np.linalg.norm(n, axis=1, keepdims=True), 1e-12)
+    rec["n"] = n
+    rec["attr"] = 0
+
+    with open(out_stl, "wb") as f:
+        f.write(b"JpegToRelief binary STL".ljust(80, b"\0"))
+        f.write(np.uint32(T).tobytes())
+        rec.tofile(f)
+
+
+def _perimeter_ring(H: int, W: int, jt, jb, il, ir) -> np.ndarray:
+    """
+    Top perimeter vertex indices, each once, walking (0,0) -> (0,W-1) -> (H-1,W-1) -> (H-1,0).
+    jt / jb are the perimeter vertex columns on rows 0 / H-1,
+    il / ir the perimeter vertex rows on columns 0 / W-1 (ascending, corners included).
+    """
+    return np.concatenate([
+        np.asarray(jt[:-1], dtype=np.int64),                      # top edge i=0
+        np.asarray(ir[:-1], dtype=np.int64) * W + (W - 1),        # right edge j=W-1
+        (H - 1) * W + np.asarray(jb[:0:-1], dtype=np.int64),      # bottom edge i=H-1
+        np.asarray(il[:0:-1], dtype=np.int64) * W,                # left edge j=0
+    ])
+
+
+def _walls_and_bottom(ring: np.ndarray, off: int) -> np.ndarray:
+    """
+    Side walls + flat bottom. Bottom vertex off+k lies under ring[k], off+len(ring) is
+    the bottom center (see _bottom_vertices). Each perimeter segment gets a 2-triangle
+    wall strip; the bottom is a fan around the center, valid because it is convex.
+    """
+    P = ring.size
+    t0, t1 = ring, np.roll(ring, -1)
+    b0 = off + np.arange(P, dtype=np.int64)
+    b1 = np.roll(b0, -1)
+    c = np.full(P, off + P, dtype=np.int64)
+    return np.concatenate([
+        np.stack([t0, t1, b0], axis=-1),
+        np.stack([t1, b1, b0], axis=-1),
+        np.stack([c, b0, b1], axis=-1),
+    ]).astype(np.int32)
+
+
+def _bottom_vertices(vertices: np.ndarray, ring: np.ndarray, W: int, H: int, px_mm: float) -> np.ndarray:
+    """(x, y, 0) under each ring vertex (copied, so walls are exactly vertical), then the bottom center"""
+    out = np.zeros((ring.size + 1, 3), dtype=np.float32)
+    out[:-1, :2] = vertices[ring, :2]
+    out[-1, :2] = ((W - 1) * px_mm * 0.5, (H - 1) * px_mm * 0.5)
+    return out
+
+
+def _block_error(z: np.ndarray, i0: int, i1: int, j0: int, j1: int) -> float:
+    """max |z - the block's 2-triangle surface| (diagonal b-c, as _adaptive_mesh emits it)"""
+    blk = z[i0:i1 + 1, j0:j1 + 1]
+    u = np.linspace(0.0, 1.0, j1 - j0 + 1)[None, :]
+    w = np.linspace(0.0, 1.0, i1 - i0 + 1)[:, None]
+    za, zb, zc, zd = blk[0, 0], blk[0, -1], blk[-1, 0], blk[-1, -1]
+    plane = np.where(u + w <= 1.0,
+                     za + u * (zb - za) + w * (zc - za),
+                     zd + (1.0 - u) * (zc - zd) + (1.0 - w) * (zb - zd))
+    return float(np.abs(blk - plane).max())
+
+
+def _adaptive_mesh(thickness_mm: np.ndarray, px_mm: float, tol: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quadtree-adaptive solid mesh of the height field.
+    Starts from an 8x8 grid of blocks and splits a block only while its
+    two triangles miss a pixel by more than tol * (thickness range). Blocks that meet finer
+    neighbours are fanned around a center vertex so the surface stays watertight.
+    Returns (vertices float32 (V,3), faces int32 (T,3)) with the same winding
+    as the regular grid mesh.
+    """
+    H, W = thickness_mm.shape
+    limit = tol * float(thickness_mm.max() - thickness_mm.min())
+
+    def idx(i, j):
+        return i * W + j
+
+    # Quadtree over vertex index ranges [i0, i1] x [j0, j1]
+    ri = np.unique(np.linspace(0, H - 1, 9).round().astype(np.int64))
+    rj = np.unique(np.linspace(0, W - 1, 9).round().astype(np.int64))
+    stack = [(ri[a], ri[a + 1], rj[b], rj[b + 1])
+             for a in range(len(ri) - 1) for b in range(len(rj) - 1)]
+    leaves = []
+    while stack:
+        i0, i1, j0, j1 = stack.pop()
+        if (i1 - i0 <= 1 and j1 - j0 <= 1) or _block_error(thickness_mm, i0, i1, j0, j1) <= limit:
+            leaves.append((i0, i1, j0, j1))
+            continue
+        si = (i0, (i0 + i1) // 2, i1) if i1 - i0 > 1 else (i0, i1)
+        sj = (j0, (j0 + j1) // 2, j1) if j1 - j0 > 1 else (j0, j1)
+        for a in range(len(si) - 1):
+            for b in range(len(sj) - 1):
+                stack.append((si[a], si[a + 1], sj[b], sj[b + 1]))
+
+    L = np.asarray(leaves, dtype=np.int64)
+    i0, i1, j0, j1 = L[:, 0], L[:, 1], L[:, 2], L[:, 3]
+
+    is_vertex = np.zeros((H, W), dtype=bool)
+    is_vertex[i0, j0] = is_vertex[i0, j1] = is_vertex[i1, j0] = is_vertex[i1, j1] = True
+
+    # Vertices on each leaf edge (corners included), via prefix sums along rows / columns
+    row_cs = np.concatenate([np.zeros((H, 1), np.int64), np.cumsum(is_vertex, axis=1)], axis=1)
+    col_cs = np.concatenate([np.zeros((1, W), np.int64), np.cumsum(is_vertex, axis=0)], axis=0)
+    on_edges = (row_cs[i0, j1 + 1] - row_cs[i0, j0] +
+                row_cs[i1, j1 + 1] - row_cs[i1, j0] +
+                col_cs[i1 + 1, j0] - col_cs[i0, j0] +
+                col_cs[i1 + 1, j1] - col_cs[i0, j1])
+    simple = on_edges == 8  # each corner counted twice: no hanging vertices
+
+    # Simple leaves: two triangles, same split as the regular grid
+    a, b = idx(i0[simple], j0[simple]), idx(i0[simple], j1[simple])
+    c, d = idx(i1[simple], j0[simple]), idx(i1[simple], j1[simple])
+    top = [np.stack([a, c, b], axis=-1), np.stack([b, c, d], axis=-1)]
+
+    # Leaves with hanging vertices: fan around a new center vertex
+    centers = []
+    n_grid = H * W
+    for i0_, i1_, j0_, j1_ in L[~simple]:
+        jt = j0_ + np.flatnonzero(is_vertex[i0_, j0_:j1_ + 1])
+        jb = j0_ + np.flatnonzero(is_vertex[i1_, j0_:j1_ + 1])
+        il = i0_ + np.flatnonzero(is_vertex[i0_:i1_ + 1, j0_])
+        ir = i0_ + np.flatnonzero(is_vertex[i0_:i1_ + 1, j1_])
+        ring = np.concatenate([
+            idx(i0_, jt[:-1]),        # a -> b
+            idx(ir[:-1], j1_),        # b -> d
+            idx(i1_, jb[:0:-1]),      # d -> c
+            idx(il[:0:-1], j0_),      # c -> a
+        ])
+        k = n_grid + len(centers)
+        centers.append(((j0_ + j1_) * 0.5, (i0_ + i1_) * 0.5,
+                        0.25 * (thickness_mm[i0_, j0_] + thickness_mm[i0_, j1_] +
+                                thickness_mm[i1_, j0_] + thickness_mm[i1_, j1_])))
+        top.append(np.stack([np.full_like(ring, k), np.roll(ring, -1), ring], axis=-1))
+
+    top_faces = np.concatenate(top)
+
+    # Side walls through every perimeter vertex
+    ring = _perimeter_ring(H, W,
+                           np.flatnonzero(is_vertex[0, :]), np.flatnonzero(is_vertex[H - 1, :]),
+                           np.flatnonzero(is_vertex[:, 0]), np.flatnonzero(is_vertex[:, W - 1]))
+
+    # Vertex buffer: top grid, fan centers, then the bottom ring + center (z=0)
+    n_top = n_grid + len(centers)
+    vertices = np.empty((n_top + ring.size + 1, 3), dtype=np.float32)
+    v_grid = vertices[:n_grid].reshape(H, W, 3)
+    v_grid[..., 0] = (np.arange(W, dtype=np.float32) * px_mm)[None, :]
+    v_grid[..., 1] = (np.arange(H, dtype=np.float32) * px_mm)[:, None]
+    v_grid[..., 2] = thickness_mm
+    if centers:
+        cv = np.asarray(centers, dtype=np.float32)
+        cv[:, :2] *= px_mm
+        vertices[n_grid:n_top] = cv
+    vertices[n_top:] = _bottom_vertices(vertices, ring, W, H, px_mm)
+
+    rest = _walls_and_bottom(ring, n_top)
+
+    faces = np.concatenate([top_faces, rest]).astype(np.int32)
+    return vertices, faces
+
+
+def heightmap_to_stl(thickness_mm: "np.ndarray | _Thickness", px_mm: float, out_stl: Path,
+                     adaptive_tol: float | None = None):
+    """
+    Create a solid STL: top surface=thickness_mm, bottom=0, with side walls.
+    adaptive_tol: if given, use the quadtree-adaptive mesh (fewer triangles in flat areas).
+    """
+    print(_heightmap_to_stl(thickness_mm, px_mm, out_stl, adaptive_tol))
+
+
+def _heightmap_to_stl(thickness_mm: "np.ndarray | _Thickness", px_mm: float, out_stl: Path,
+                      adaptive_tol: float | None = None) -> str:
+    """heightmap_to_stl, but returns the report instead of printing it"""
+    if adaptive_tol is not None:
+        if isinstance(thickness_mm, _Thickness):
+            thickness_mm = thickness_mm.as_float32()
+        vertices, faces = _adaptive_mesh(thickness_mm, px_mm, adaptive_tol)
+        write_binary_stl(vertices, faces, out_stl)
+        return f"saved: {out_stl.name} (in {out_stl.parent}), {faces.shape[0]} triangles (adaptive)"
+
+    H, W = thickness_mm.values.shape if isinstance(thickness_mm, _Thickness) else thickness_mm.shape
+
+    xs = np.arange(W, dtype=np.float32) * px_mm
+    ys = np.arange(H, dtype=np.float32) * px_mm
+
+    jj = np.arange(W, dtype=np.int64)
+    ii = np.arange(H, dtype=np.int64)
+    ring = _perimeter_ring(H, W, jj, jj, ii, ii)
+
+    # One vertex buffer: top grid (z=thickness) followed by the bottom ring + center (z=0)
+    offset = H * W
+    vertices = np.empty((offset + ring.size + 1, 3), dtype=np.float32)
+    v_top = vertices[:offset].reshape(H, W, 3)
+    v_top[..., 0] = xs[None, :]
+    v_top[..., 1] = ys[:, None]
+    if isinstance(thickness_mm, _Thickness):
+        thickness_mm.as_float32(out=v_top[..., 2])  # promoted straight into the vertex buffer
+    else:
+        v_top[..., 2] = thickness_mm
+    vertices[offset:] = _bottom_vertices(vertices, ring, W, H, px_mm)
+
+    def idx(i, j):
+        return i * W + j
+
+    # Triangle count: 2 per top cell, 2 wall + 1 bottom fan triangle per perimeter edge.
+    # Indices stay far below 2**31, so int32 halves the face buffer vs int64.
+    T = 2 * (H - 1) * (W - 1) + 3 * ring.size
+    faces = np.empty((T, 3), dtype=np.int32)
+    n = 0
+
+    def emit(*tris):
+        # Write each triangle set column by column (sequential index streams)
+        nonlocal n
+        for tri in tris:
+            k = tri[0].size
+            for col, v in enumerate(tri):
+                faces[n:n + k, col] = v.ravel()
+            n += k
+
+    # Top faces
+    i = np.arange(H - 1, dtype=np.int32)[:, None]
+    j = np.arange(W - 1, dtype=np.int32)[None, :]
+    a = idx(i, j)
+    b = a + 1
+    c = a + W
+    d = c + 1
+    emit((a, c, b), (b, c, d))
+
+    # Side walls + bottom (perimeter)
+    faces[n:] = _walls_and_bottom(ring, offset)
+
+    write_binary_stl(vertices, faces, out_stl)
+    return f"saved: {out_stl.name} (in {out_stl.parent})"
+
+
+def resolve_out_base(in_path: Path, out_opt: str | None, width_mm: float) -> Path:
+    """
+    Output base path (without extension).
+    Default: <input_dir>/<input_stem>_W<width_mm>mm
+    If --out is given:
+      - absolute path: use as-is (no extension expected)
+      - relative path: resolve under input_dir
+    """
+    input_dir = in_path.parent
+    if out_opt is None:
+        return input_dir / f"{in_path.stem}_W{width_mm:g}mm"
+
+    out_path = Path(out_opt)
+    if out_path.is_absolute():
+        return out_path
+    return input_dir / out_path
+
+
+def build_arg_parser(description: str, invert: dict) -> argparse.ArgumentParser:
+    """
+    Command-line options shared by both CLIs.
+    invert: add_argument() keywords for --invert, the only option whose default differs.
+    """
+    ap = argparse.ArgumentParser(description=description)
+
+    ap.add_argument("-i", "--in", dest="in_path", required=True,
+                    help="Input image file (jpg/png/webp/...)")
+
+    ap.add_argument("--width-mm", type=float, default=DEFAULT_WIDTH_MM,
+                    help=f"Physical width in mm (default: {DEFAULT_WIDTH_MM:g})")
+
+    ap.add_argument("--px", type=int, default=TARGET_WIDTH_PX_DEFAULT,
+                    help=f"Output width in pixels (default: {TARGET_WIDTH_PX_DEFAULT})")
+    ap.add_argument("--base-mm", type=float, default=BASE_THICK_MM_DEFAULT,
+                    help=f"Base thickness in mm (default: {BASE_THICK_MM_DEFAULT})")
+    ap.add_argument("--relief-mm", type=float, default=RELIEF_MM_DEFAULT,
+                    help=f"Relief height in mm (default: {RELIEF_MM_DEFAULT})")
+
+    ap.add_argument("--black", type=float, default=BLACK_CUT_DEFAULT,
+                    help=f"Black cut (default: {BLACK_CUT_DEFAULT})")
+    ap.add_argument("--white", type=float, default=WHITE_CUT_DEFAULT,
+                    help=f"White cut (default: {WHITE_CUT_DEFAULT})")
+    ap.add_argument("--tone", type=float, default=TONE_GAMMA_DEFAULT,
+                    help=f"Tone gamma (1.0 = linear). default: {TONE_GAMMA_DEFAULT}")
+
+    ap.add_argument("--invert", **invert)
+
+    ap.add_argument("--flip-x", action="store_true", help="Mirror left-right.")
+    ap.add_argument("--flip-y", action="store_true", help="Mirror top-bottom.")
+    ap.add_argument("--rot180", action="store_true", help="Rotate 180 deg (same as --flip-x --flip-y).")
+
+    ap.add_argument("--out", default=None,
+                    help="Output basename (no extension). "
+                         "Default: <input_stem>_W<width_mm>mm. "
+                         "Relative path is resolved under input image folder.")
+    ap.add_argument("--no-stl", action="store_true",
+                    help="Do not export STL (still exports PNG16 + NPY).")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="Adaptive STL mesh: dense triangles only where the relief curves.")
+    ap.add_argument("--adaptive-tol", type=float, default=ADAPTIVE_TOL_DEFAULT,
+                    help=f"Adaptive mesh tolerance (fraction of thickness range). default: {ADAPTIVE_TOL_DEFAULT}")
+
+    return ap
+
+
+def run(args: argparse.Namespace):
+    """Convert one image as described by parsed build_arg_parser() options"""
+    in_path = Path(args.in_path)
+    if not in_path.exists():
+        raise FileNotFoundError(str(in_path))
+
+    out_base = resolve_out_base(in_path, args.out, args.width_mm)
+
+    thickness, px_mm = _make_thickness(
+        img_path=str(in_path),
+        target_width_mm=args.width_mm,
+        target_width_px=args.px,
+        base_thick_mm=args.base_mm,
+        relief_mm=args.relief_mm,
+        black_cut=args.black,
+        white_cut=args.white,
+        tone_gamma=args.tone,
+        invert=args.invert,
+        flip_x=args.flip_x,
+        flip_y=args.flip_y,
+        rot180=args.rot180
+    )
+
+    # PNG16/NPY writing is I/O-bound and independent of the STL build, so overlap them
+    # (NumPy, numba and file I/O release the GIL). Reports are printed here, in order,
+    # once both are done; the save is always joined so its errors surface too.
+    stl_report = None
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        heightmap = pool.submit(_save_heightmap, thickness,
+                                out_base.with_name(out_base.name + "_height_16bit.png"),
+                                out_base.with_name(out_base.name + "_height_mm.npy"))
+        try:
+            if not args.no_stl:
+                stl_report = _heightmap_to_stl(thickness, px_mm, out_base.with_suffix(".stl"),
+                                               adaptive_tol=args.adaptive_tol if args.adaptive else None)
+        finally:
+            heightmap_report = heightmap.result()
+
+    print(heightmap_report)
+    if stl_report is not None:
+        print(stl_report)
+